@@ -1,14 +1,26 @@
+import asyncio
+import os
+import stat
 import sys
-import json
 import threading
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Optional, List, Union
-from .ast import Root
+from .ast import DEFAULT_CACHE_PATH, Root, dumps_json, loads_json
 from pathlib import Path
 
+try:
+    import uvloop
+except ImportError:  # optional: falls back to the default asyncio loop
+    uvloop = None
+
 logging.basicConfig(stream=sys.stderr, level=logging.DEBUG)
 
+# Encoded results that are the same for every request; only the envelope
+# around them is serialized per response
+_INITIALIZE_RESULT = dumps_json({"capabilities": {}})
+
 
 @dataclass
 class DocumentUri:
@@ -50,32 +62,46 @@ class InitializeParams:
 
 class JsonRpc:
     def __init__(self):
-        self.stdin = sys.stdin
-        self.stdout = sys.stdout
+        self.stdout = sys.stdout.buffer
+        # Responses are sent from worker threads; keep each frame whole
+        self._write_lock = threading.Lock()
+
+    async def read_message(self, reader: asyncio.StreamReader) -> Optional[dict]:
+        try:
+            header = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
 
-    def read_message(self):
         content_length = 0
-
-        while True:
-            line = self.stdin.readline()
-            if not line:
-                return None
-            if line.startswith("Content-Length:"):
-                content_length = int(line.split(":")[1].strip())
-            if line.strip() == "":
-                break
+        for line in header.split(b"\r\n"):
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                content_length = int(value.strip())
 
         if content_length == 0:
             return None
 
-        content = self.stdin.read(content_length)
-        return json.loads(content)
+        try:
+            content = await reader.readexactly(content_length)
+        except asyncio.IncompleteReadError:
+            return None
+        return loads_json(content)
 
     def send_message(self, message: dict):
-        body = json.dumps(message)
-        response = f"Content-Length: {len(body)}\r\n\r\n{body}"
-        self.stdout.write(response)
-        self.stdout.flush()
+        self._write_frame(dumps_json(message))
+
+    def send_result(self, id_, result: bytes):
+        """Send a response whose result is already encoded JSON"""
+        self._write_frame(
+            b'{"jsonrpc":"2.0","id":' + dumps_json(id_) + b',"result":' + result + b"}"
+        )
+
+    def _write_frame(self, body: bytes):
+        header = b"Content-Length: %d\r\n\r\n" % len(body)
+        with self._write_lock:
+            self.stdout.write(header)
+            self.stdout.write(body)
+            self.stdout.flush()
 
     def handle_request(self, request: dict):
         method = request.get("method")
@@ -84,8 +110,7 @@ class JsonRpc:
 
         if method == "initialize":
             logging.debug(f"Received initialize with params: {params}")
-            result = {"jsonrpc": "2.0", "id": id_, "result": {"capabilities": {}}}
-            self.send_message(result)
+            self.send_result(id_, _INITIALIZE_RESULT)
         else:
             logging.warning(f"Unknown method: {method}")
             error = {
@@ -96,16 +121,72 @@ class JsonRpc:
             self.send_message(error)
 
 
+def _log_request_error(future):
+    """Log an exception raised by a request handler run in the pool"""
+    if not future.cancelled() and future.exception() is not None:
+        logging.error("Request handler failed", exc_info=future.exception())
+
+
+async def _open_stdin(loop: asyncio.AbstractEventLoop) -> asyncio.StreamReader:
+    """Stream reader over stdin.
+
+    Pipes and sockets get a pipe transport. Pipe transports reject regular
+    files (uvloop aborts the process), so ``lsp < session.bin`` is fed from
+    a worker thread instead.
+    """
+    reader = asyncio.StreamReader()
+    if not stat.S_ISREG(os.fstat(sys.stdin.fileno()).st_mode):
+        try:
+            await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer
+            )
+            return reader
+        except (OSError, ValueError):
+            pass
+    loop.run_in_executor(None, _feed_stdin, loop, reader)
+    return reader
+
+
+def _feed_stdin(loop: asyncio.AbstractEventLoop, reader: asyncio.StreamReader):
+    """Copy stdin into ``reader`` with blocking reads, until EOF"""
+    stdin = sys.stdin.buffer
+    while True:
+        chunk = stdin.read1(65536)
+        if not chunk:
+            break
+        loop.call_soon_threadsafe(reader.feed_data, chunk)
+    loop.call_soon_threadsafe(reader.feed_eof)
+
+
 class LspServer:
     def __init__(self):
         self.rpc = JsonRpc()
-
-    def start(self):
-        while True:
-            message = self.rpc.read_message()
-            if message is None:
-                break
-            threading.Thread(target=self.rpc.handle_request, args=(message,)).start()
+        self._pool = ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 4, thread_name_prefix="lsp-rpc"
+        )
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        reader = await _open_stdin(loop)
+        try:
+            while True:
+                message = await self.rpc.read_message(reader)
+                if message is None:
+                    break
+                future = loop.run_in_executor(
+                    self._pool, self.rpc.handle_request, message
+                )
+                future.add_done_callback(_log_request_error)
+        finally:
+            self._pool.shutdown(wait=True)
+
+
+def serve():
+    """Run the language server over stdin/stdout"""
+    if uvloop is not None:
+        uvloop.run(LspServer().start())
+    else:
+        asyncio.run(LspServer().start())
 
 
 class Node:
@@ -113,8 +194,8 @@ class Node:
 
 
 def main():
-    # LspServer().start()
-    root = Root(file_path=Path("test/c.forge.ast.json"))
+    # serve()
+    root = Root(file_path=Path("test/c.forge.ast.json"), cache_path=DEFAULT_CACHE_PATH)
 
     node = root.find_node_at_position(
         "file:///Users/meek/Developer/lsp/C.sol", line=10, character=10
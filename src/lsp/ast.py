@@ -1,9 +1,36 @@
+import hashlib
 import json
-from typing import Dict, List, Optional, Tuple
+import multiprocessing
+import os
+import re
+import sqlite3
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from functools import lru_cache
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib parser
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # optional: only needed for Root(streaming=True)
+    ijson = None
+
+# Bump when the layout written by PositionIndex.pack changes
+_INDEX_CACHE_VERSION = 5
+
+DEFAULT_CACHE_PATH = Path("~/.cache/solidity-ast/index.sqlite").expanduser()
+
 
 class Severity(Enum):
     WARNING = "warning"
@@ -15,6 +42,51 @@ class ErrorType(Enum):
     ERROR = "Error"
 
 
+# Lowercased compiler output strings -> enum members
+_SEVERITIES = {"warning": Severity.WARNING, "error": Severity.ERROR}
+_ERROR_TYPES = {"warning": ErrorType.WARNING, "error": ErrorType.ERROR}
+
+
+# Node id embedded in a typeIdentifier, e.g. "t_struct$_State_$4805_storage"
+_TYPE_ID_RE = re.compile(r"\$(\d+)")
+_TYPE_ID_SEARCH = _TYPE_ID_RE.search
+
+# AST keys whose list values hold child nodes
+_LIST_KEYS = frozenset(
+    {
+        "nodes",
+        "body",
+        "statements",
+        "members",
+        "parameters",
+        "declarations",
+        "symbolAliases",
+        "arguments",
+        "assignments",
+        "baseContracts",
+        "modifiers",
+    }
+)
+
+# AST keys whose dict values are child nodes
+_DICT_KEYS = frozenset(
+    {
+        "expression",
+        "leftExpression",
+        "leftHandSide",
+        "rightExpression",
+        "rightHandSide",
+        "value",
+        "typeName",
+        "baseExpression",
+        "parameters",
+        "baseName",
+        "parameterTypes",
+        "returnParameterTypes",
+    }
+)
+
+
 @dataclass
 class SourceLocation:
     file: str
@@ -22,7 +94,7 @@ class SourceLocation:
     end: int
 
 
-@dataclass
+@dataclass(frozen=True)
 class AstNodeIndex:
     """Spatial index entry for AST nodes"""
 
@@ -31,56 +103,412 @@ class AstNodeIndex:
     start_byte: int
     end_byte: int
     node_type: str
-    node_data: dict
     depth: int  # nesting depth for finding innermost node
+    # Declaration ids used for go-to-definition, or None when absent
+    referenced_declaration: Optional[int] = None
+    type_identifier_target: Optional[int] = None
+
+
+# Numeric PositionTable columns with their array typecodes. Byte offsets and
+# node ids are 32-bit and depths 16-bit to keep the scanned columns compact;
+# node types are 16-bit indexes into a palette of type names. Appending a
+# value that does not fit raises OverflowError.
+_PACKED_COLUMNS = (
+    ("starts", "i"),
+    ("ends", "i"),
+    ("depths", "h"),
+    ("node_ids", "i"),
+    ("referenced_decls", "i"),
+    ("type_targets", "i"),
+    ("type_ids", "H"),
+)
+
+# Stored in referenced_decls / type_targets when a node has no such id
+_NO_TARGET = -1
+
+
+@dataclass
+class PositionTable:
+    """Column-oriented index entries for the nodes of one source file.
+
+    Rows are added to plain lists while the index is built; ``finalize``
+    sorts them by start position, packs the numeric columns into typed
+    arrays and links each row to its enclosing row. ``AstNodeIndex``
+    records are only created for rows handed back to callers.
+    """
+
+    file_id: int
+    starts: Sequence[int] = field(default_factory=list)
+    ends: Sequence[int] = field(default_factory=list)
+    depths: Sequence[int] = field(default_factory=list)
+    node_ids: Sequence[int] = field(default_factory=list)
+    # referencedDeclaration and the id in typeDescriptions.typeIdentifier,
+    # or _NO_TARGET
+    referenced_decls: Sequence[int] = field(default_factory=list)
+    type_targets: Sequence[int] = field(default_factory=list)
+    # Index into type_names, the palette shared by all tables of an index
+    type_ids: Sequence[int] = field(default_factory=list)
+    type_names: List[str] = field(default_factory=list, repr=False)
+    # Row of the innermost span enclosing each row, or -1; see link_parents
+    parents: Sequence[int] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def finalize(self, type_remap: Optional[Sequence[int]] = None):
+        """Sort rows by (start, -end, depth, id), pack the numeric columns
+        and link parents.
+
+        Enclosing spans sort before the spans they contain; depth and id
+        break ties between equal spans, so the order does not depend on how
+        the rows were collected. ``type_remap`` maps old type ids to new
+        ones when the palette has been reordered.
+        """
+        starts, ends = self.starts, self.ends
+        depths, node_ids = self.depths, self.node_ids
+        order = sorted(
+            range(len(starts)),
+            key=lambda i: (starts[i], -ends[i], depths[i], node_ids[i]),
+        )
+        if type_remap is not None:
+            type_ids = self.type_ids
+            self.type_ids = [type_remap[type_ids[i]] for i in range(len(type_ids))]
+        for name, code in _PACKED_COLUMNS:
+            column = getattr(self, name)
+            setattr(self, name, array(code, [column[i] for i in order]))
+        self.link_parents()
+
+    def link_parents(self):
+        """Point each row at the innermost earlier row whose span encloses it.
+
+        Needs the ``finalize`` order. AST spans nest, so the rows still open
+        at a row's start form a stack and the top of it is the parent.
+        """
+        starts, ends = self.starts, self.ends
+        parents = array("i")
+        open_rows = []
+        for row in range(len(starts)):
+            start = starts[row]
+            while open_rows and ends[open_rows[-1]] <= start:
+                open_rows.pop()
+            parents.append(open_rows[-1] if open_rows else -1)
+            open_rows.append(row)
+        self.parents = parents
+
+    def containing_rows(self, byte_offset: int) -> Iterator[int]:
+        """Rows whose span contains the byte offset, innermost first.
+
+        Every container of the offset encloses the last row starting at or
+        before it, so the walk bisects to that row and follows parents:
+        O(log N + depth).
+        """
+        ends, parents = self.ends, self.parents
+        row = bisect_right(self.starts, byte_offset) - 1
+        while row >= 0:
+            if byte_offset < ends[row]:
+                yield row
+            row = parents[row]
+
+    def node_at(self, row: int) -> AstNodeIndex:
+        """Materialize the index entry stored at ``row``"""
+        referenced_decl = self.referenced_decls[row]
+        type_target = self.type_targets[row]
+        return AstNodeIndex(
+            node_id=self.node_ids[row],
+            file_id=self.file_id,
+            start_byte=self.starts[row],
+            end_byte=self.ends[row],
+            node_type=self.type_names[self.type_ids[row]],
+            depth=self.depths[row],
+            referenced_declaration=(
+                None if referenced_decl == _NO_TARGET else referenced_decl
+            ),
+            type_identifier_target=None if type_target == _NO_TARGET else type_target,
+        )
 
 
 @dataclass
 class PositionIndex:
     """Spatial index for fast position-to-node lookups"""
 
-    file_nodes: Dict[int, List[AstNodeIndex]] = field(default_factory=dict)
-    node_by_id: Dict[int, AstNodeIndex] = field(default_factory=dict)
+    file_tables: Dict[int, PositionTable] = field(default_factory=dict)
+    # node id -> (file_id, row in that file's table)
+    node_by_id: Dict[int, Tuple[int, int]] = field(default_factory=dict)
     file_id_to_path: Dict[int, str] = field(default_factory=dict)
+    # Reverse lookups of file_id_to_path, built when the index is finalized
+    path_to_file_id: Dict[str, int] = field(default_factory=dict)
+    uri_to_file_id: Dict[str, int] = field(default_factory=dict)
+    # Distinct node types; tables store indexes into this list
+    type_names: List[str] = field(default_factory=list)
+    # type name -> its index in type_names
+    _type_palette: Dict[str, int] = field(default_factory=dict, init=False, repr=False)
+    # Raw URI -> result of resolve_file_id
+    _resolved_uris: Dict[str, Optional[int]] = field(
+        default_factory=dict, init=False, repr=False
+    )
 
-    def add_node(self, node_index: AstNodeIndex):
-        """Add a node to the spatial index"""
-        file_id = node_index.file_id
-        if file_id not in self.file_nodes:
-            self.file_nodes[file_id] = []
-
-        self.file_nodes[file_id].append(node_index)
-        self.node_by_id[node_index.node_id] = node_index
+    def __post_init__(self):
+        self._type_palette = {name: i for i, name in enumerate(self.type_names)}
+
+    def _type_id(self, node_type: str) -> int:
+        """Palette index of a node type, adding it if it is new"""
+        type_id = self._type_palette.get(node_type)
+        if type_id is None:
+            type_id = self._type_palette[node_type] = len(self.type_names)
+            self.type_names.append(sys.intern(node_type))
+        return type_id
+
+    def _table(self, file_id: int) -> PositionTable:
+        """The table of a file, created on first use"""
+        table = self.file_tables.get(file_id)
+        if table is None:
+            table = self.file_tables[file_id] = PositionTable(
+                file_id, type_names=self.type_names
+            )
+        return table
+
+    def add_nodes(self, columns: Dict[str, Sequence]):
+        """Add the rows of ``_index_ast`` output to the spatial index"""
+        file_ids = columns["file_ids"]
+        rows_by_file: Dict[int, List[int]] = {}
+        for row, file_id in enumerate(file_ids):
+            rows_by_file.setdefault(file_id, []).append(row)
+
+        # Translate the output's own type palette into this index's
+        remap = [self._type_id(name) for name in columns["type_names"]]
+        columns = dict(columns, type_ids=[remap[i] for i in columns["type_ids"]])
+
+        for file_id, rows in rows_by_file.items():
+            table = self._table(file_id)
+            whole = len(rows) == len(file_ids)
+            for name, _ in _PACKED_COLUMNS:
+                column = columns[name]
+                getattr(table, name).extend(
+                    column if whole else [column[row] for row in rows]
+                )
 
     def finalize_index(self):
         """Sort nodes by start position for binary search"""
-        for file_id in self.file_nodes:
-            self.file_nodes[file_id].sort(key=lambda x: (x.start_byte, -x.depth))
+        # Sort the palette too, so type ids do not depend on build order
+        order = sorted(range(len(self.type_names)), key=self.type_names.__getitem__)
+        type_remap = [0] * len(order)
+        for new_id, old_id in enumerate(order):
+            type_remap[old_id] = new_id
+        self.type_names[:] = [self.type_names[i] for i in order]
+        self._type_palette = {name: i for i, name in enumerate(self.type_names)}
+
+        self.node_by_id.clear()
+        for file_id, table in self.file_tables.items():
+            table.finalize(type_remap)
+            for row, node_id in enumerate(table.node_ids):
+                self.node_by_id[node_id] = (file_id, row)
+        self._index_paths()
+
+    def _index_paths(self):
+        """Build the path and URI lookups from file_id_to_path"""
+        self.path_to_file_id = {
+            path: file_id for file_id, path in self.file_id_to_path.items()
+        }
+        self.uri_to_file_id = {
+            f"file://{path}": file_id for file_id, path in self.file_id_to_path.items()
+        }
+        self._resolved_uris.clear()
+
+    def resolve_file_id(self, file_uri: str) -> Optional[int]:
+        """Find the file_id for a document URI.
+
+        Tries an exact URI or path match, then the longest trailing run of
+        path components that is a known (relative) path, then known paths
+        ending with the URI's path. Results are memoized per URI.
+        """
+        if file_uri in self._resolved_uris:
+            return self._resolved_uris[file_uri]
+
+        path = file_uri.replace("file://", "", 1)
+        file_id = self.uri_to_file_id.get(file_uri)
+        if file_id is None:
+            file_id = self.path_to_file_id.get(path)
+        if file_id is None:
+            parts = path.split("/")
+            for i in range(1, len(parts)):
+                file_id = self.path_to_file_id.get("/".join(parts[i:]))
+                if file_id is not None:
+                    break
+        if file_id is None and path:
+            for known_path, fid in self.path_to_file_id.items():
+                if known_path.endswith(path):
+                    file_id = fid
+                    break
+
+        self._resolved_uris[file_uri] = file_id
+        return file_id
+
+    def pack(self) -> Tuple[Dict[str, bytes], dict]:
+        """Serialize the finalized index as packed columns plus metadata.
+
+        Numeric columns of all files are concatenated in ``meta["files"]``
+        order.
+        """
+        columns = {name: array(code) for name, code in _PACKED_COLUMNS}
+        files = []
+        for file_id, table in self.file_tables.items():
+            files.append([file_id, len(table)])
+            for name, _ in _PACKED_COLUMNS:
+                columns[name].extend(getattr(table, name))
+        meta = {
+            "files": files,
+            "file_id_to_path": {
+                str(file_id): path for file_id, path in self.file_id_to_path.items()
+            },
+            "type_names": self.type_names,
+        }
+        return {name: column.tobytes() for name, column in columns.items()}, meta
+
+    @classmethod
+    def unpack(cls, blobs: Dict[str, bytes], meta: dict) -> "PositionIndex":
+        """Rebuild an index from the output of ``pack``"""
+        columns = {}
+        for name, code in _PACKED_COLUMNS:
+            columns[name] = array(code)
+            columns[name].frombytes(blobs[name])
+
+        index = cls(
+            file_id_to_path={
+                int(file_id): path for file_id, path in meta["file_id_to_path"].items()
+            },
+            type_names=[sys.intern(name) for name in meta["type_names"]],
+        )
+        offset = 0
+        for file_id, rows in meta["files"]:
+            end = offset + rows
+            table = PositionTable(file_id, type_names=index.type_names)
+            for name, _ in _PACKED_COLUMNS:
+                setattr(table, name, columns[name][offset:end])
+            table.link_parents()
+            index.file_tables[file_id] = table
+            for row, node_id in enumerate(table.node_ids):
+                index.node_by_id[node_id] = (file_id, row)
+            offset = end
+        index._index_paths()
+        return index
+
+    def get_node(self, node_id: int) -> Optional[AstNodeIndex]:
+        """Look up an indexed node by its AST id"""
+        location = self.node_by_id.get(node_id)
+        if location is None:
+            return None
+        file_id, row = location
+        return self.file_tables[file_id].node_at(row)
 
     def find_nodes_at_position(
         self, file_id: int, byte_offset: int
     ) -> List[AstNodeIndex]:
         """Find all nodes containing the given byte offset"""
-        if file_id not in self.file_nodes:
+        table = self.file_tables.get(file_id)
+        if table is None:
             return []
 
-        nodes = self.file_nodes[file_id]
-        containing_nodes = []
-
-        for node in nodes:
-            if node.start_byte <= byte_offset < node.end_byte:
-                containing_nodes.append(node)
-
-        # Sort by depth (deepest first) for innermost node
-        containing_nodes.sort(key=lambda x: -x.depth)
-        return containing_nodes
+        # Innermost (deepest) first
+        return [table.node_at(row) for row in table.containing_rows(byte_offset)]
 
     def find_innermost_node(
         self, file_id: int, byte_offset: int
     ) -> Optional[AstNodeIndex]:
         """Find the innermost (deepest) node containing the position"""
-        nodes = self.find_nodes_at_position(file_id, byte_offset)
-        return nodes[0] if nodes else None
+        table = self.file_tables.get(file_id)
+        if table is None:
+            return None
+
+        for row in table.containing_rows(byte_offset):
+            return table.node_at(row)
+        return None
+
+
+@dataclass
+class SourceText:
+    """UTF-8 source bytes plus the byte offset at which each line starts.
+
+    Only the line being converted is ever sliced out and decoded.
+    """
+
+    content: bytes
+    line_offsets: Sequence[int]
+    # line -> (UTF-16 offset, UTF-8 offset) after each character, for
+    # non-ASCII lines; built on first use
+    _line_tables: Dict[int, Tuple[Sequence[int], Sequence[int]]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    @classmethod
+    def from_bytes(cls, content: bytes) -> "SourceText":
+        line_offsets = array("q", [0])
+        newline = content.find(b"\n")
+        while newline != -1:
+            line_offsets.append(newline + 1)
+            newline = content.find(b"\n", newline + 1)
+        return cls(content, line_offsets)
+
+    @classmethod
+    def from_file(cls, file_path) -> "SourceText":
+        """Read ``file_path`` as raw bytes, without decoding it"""
+        with open(file_path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def line_bytes(self, line: int) -> bytes:
+        """Bytes of ``line`` without its trailing newline"""
+        start = self.line_offsets[line]
+        if line + 1 < len(self.line_offsets):
+            return self.content[start : self.line_offsets[line + 1] - 1]
+        return self.content[start:]
+
+    def _line_table(self, line: int) -> Tuple[Sequence[int], Sequence[int]]:
+        """Prefix sums of UTF-16 code units and UTF-8 bytes per character"""
+        table = self._line_tables.get(line)
+        if table is None:
+            code_points = [ord(char) for char in self.line_bytes(line).decode("utf-8")]
+            utf16 = array("q", [0])
+            utf16.extend(accumulate(1 if cp < 0x10000 else 2 for cp in code_points))
+            utf8 = array("q", [0])
+            utf8.extend(
+                accumulate(
+                    1 if cp < 0x80 else 2 if cp < 0x800 else 3 if cp < 0x10000 else 4
+                    for cp in code_points
+                )
+            )
+            table = self._line_tables[line] = (utf16, utf8)
+        return table
+
+    def position_to_offset(self, line: int, character_utf16: int) -> int:
+        """Convert LSP position (line, UTF-16 character) to byte offset"""
+        if line >= len(self.line_offsets):
+            return len(self.content)
+
+        line_bytes = self.line_bytes(line)
+        if line_bytes.isascii():
+            byte_offset_in_line = min(max(character_utf16, 0), len(line_bytes))
+        else:
+            # First character boundary at or past the requested UTF-16 offset
+            utf16, utf8 = self._line_table(line)
+            char_index = min(bisect_left(utf16, character_utf16), len(utf16) - 1)
+            byte_offset_in_line = utf8[char_index]
+
+        return self.line_offsets[line] + byte_offset_in_line
+
+    def offset_to_position(self, byte_offset: int) -> Tuple[int, int]:
+        """Convert byte offset to LSP position (line, UTF-16 character)"""
+        if byte_offset >= len(self.content):
+            line = len(self.line_offsets) - 1
+            byte_in_line = len(self.content) - self.line_offsets[line]
+        else:
+            line = max(bisect_right(self.line_offsets, byte_offset) - 1, 0)
+            byte_in_line = byte_offset - self.line_offsets[line]
+
+        if self.line_bytes(line).isascii():
+            return (line, byte_in_line)
+
+        # Last character boundary at or before the byte offset
+        utf16, utf8 = self._line_table(line)
+        return (line, utf16[bisect_right(utf8, byte_in_line) - 1])
 
 
 @dataclass
@@ -113,25 +541,41 @@ class SourceFile:
     ast: dict
 
     def preorder(self, node):
-        if node is None:
-            return
-        self.preorder(node.left)
-        self.preorder(node.right)
-        self.process(node)
+        """Yield node, then its left and right subtrees"""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            yield node
+            stack.append(node.right)
+            stack.append(node.left)
 
     def inorder(self, node):
-        if node is None:
-            return
-        self.inorder(node.left)
-        self.process(node)
-        self.inorder(node.right)
+        """Yield the left subtree, then node, then the right subtree"""
+        stack = []
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield node
+                node = node.right
 
     def postorder(self, node):
-        if node is None:
-            return
-        self.postorder(node.left)
-        self.postorder(node.right)
-        self.process(node)
+        """Yield the left and right subtrees, then node"""
+        # Collect root-right-left order, then emit it reversed
+        stack, visited = [node], []
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            visited.append(node)
+            stack.append(node.left)
+            stack.append(node.right)
+        while visited:
+            yield visited.pop()
 
     def process(self, node):
         pass
@@ -159,10 +603,130 @@ class Root:
     build_infos: List[BuildInfo] = field(default_factory=list)
     file_path: Path = Path("")
     position_index: PositionIndex = field(default_factory=PositionIndex)
+    # SQLite file caching the built index; on a hit the JSON is not parsed
+    # and ``sources`` stays empty
+    cache_path: Optional[Path] = None
+    # Build the index from a streaming parse (needs ijson) instead of loading
+    # the whole JSON; ``sources`` stays empty
+    streaming: bool = False
+    # Worker processes for indexing the ASTs; 1 indexes in this process.
+    # Workers take ~0.3 s to start, while PoolManager's 45 files (7.5 MB)
+    # index serially in ~0.05 s, so only very large projects gain.
+    workers: int = 1
+    # file_id -> ((mtime_ns, size), source text)
+    _source_cache: Dict[int, Tuple[Tuple[int, int], SourceText]] = field(
+        default_factory=dict, init=False, repr=False
+    )
 
     def __post_init__(self):
-        self._initialize(self.file_path)
-        self._build_position_index()
+        if self.streaming and ijson is None:
+            raise ImportError(
+                "Root(streaming=True) needs ijson; install the 'fast' extra"
+            )
+        # Memoized lookups over the index, which never changes once built.
+        # Declaration targets are memoized as nodes; their line/column is
+        # converted on every call so it follows edits to the target file.
+        self._lookup_cache = lru_cache(maxsize=4096)(self._lookup_node)
+        self._declaration_cache = lru_cache(maxsize=4096)(self._declaration_target)
+        if self.cache_path is not None and self._load_cached_index():
+            return
+        if self.streaming:
+            self._stream_initialize(self.file_path)
+        else:
+            self._initialize(self.file_path)
+            self._build_position_index()
+        if self.cache_path is not None:
+            self._store_cached_index()
+
+    def _cache_key(self) -> str:
+        """Key the index cache by AST file path, mtime, size and format"""
+        path = Path(self.file_path).resolve()
+        stat = path.stat()
+        key = f"{path}:{stat.st_mtime_ns}:{stat.st_size}:{_INDEX_CACHE_VERSION}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _connect_cache(self) -> sqlite3.Connection:
+        """Open the cache database, dropping entries of an older layout"""
+        cache_path = Path(self.cache_path).expanduser()
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(cache_path))
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+        if version != _INDEX_CACHE_VERSION:
+            conn.execute("DROP TABLE IF EXISTS index_cache")
+            conn.execute(f"PRAGMA user_version = {_INDEX_CACHE_VERSION}")
+        columns = ", ".join(f"{name} BLOB" for name, _ in _PACKED_COLUMNS)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS index_cache "
+            f"(key TEXT PRIMARY KEY, {columns}, meta BLOB)"
+        )
+        return conn
+
+    def _load_cached_index(self) -> bool:
+        """Restore the position index, errors and build infos from the cache"""
+        names = [name for name, _ in _PACKED_COLUMNS]
+        try:
+            key = self._cache_key()
+            with closing(self._connect_cache()) as conn:
+                row = conn.execute(
+                    f"SELECT {', '.join(names)}, meta FROM index_cache WHERE key = ?",
+                    (key,),
+                ).fetchone()
+        except (OSError, sqlite3.Error):
+            return False
+        if row is None:
+            return False
+
+        meta = loads_json(row[-1])
+        self.position_index = PositionIndex.unpack(dict(zip(names, row)), meta)
+        self.errors = [
+            Errors(
+                SourceLocation(**error["source_location"]),
+                ErrorType(error["error_type"]),
+                error["error_code"],
+                Severity(error["severity"]),
+                error["message"],
+            )
+            for error in meta["errors"]
+        ]
+        self.build_infos = [BuildInfo(**info) for info in meta["build_infos"]]
+        return True
+
+    def _store_cached_index(self):
+        """Write the built position index, errors and build infos to the cache"""
+        blobs, meta = self.position_index.pack()
+        meta["errors"] = [
+            {
+                "source_location": {
+                    "file": error.source_location.file,
+                    "start": error.source_location.start,
+                    "end": error.source_location.end,
+                },
+                "error_type": error.error_type.value,
+                "error_code": error.error_code,
+                "severity": error.severity.value,
+                "message": error.message,
+            }
+            for error in self.errors
+        ]
+        meta["build_infos"] = [
+            {
+                "id": info.id,
+                "source_id_to_path": info.source_id_to_path,
+                "language": info.language,
+            }
+            for info in self.build_infos
+        ]
+        names = [name for name, _ in _PACKED_COLUMNS]
+        try:
+            key = self._cache_key()
+            with closing(self._connect_cache()) as conn, conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO index_cache (key, {', '.join(names)}, "
+                    f"meta) VALUES (?, {', '.join('?' for _ in names)}, ?)",
+                    (key, *(blobs[name] for name in names), dumps_json(meta)),
+                )
+        except (OSError, sqlite3.Error):
+            pass
 
     def search_id(self, id: int):
         for _, files in self.sources.items():
@@ -198,75 +762,53 @@ class Root:
                         source.append(f)
                 self.sources[filename] = source
 
+        self._load_errors(_errors)
+        self._load_build_infos(_build_infos)
+
+    def _load_errors(self, _errors):
         if _errors:
-            for error in _errors:
-                _sourceLocation = error.get("sourceLocation")
-                _type = error.get("type")
-                _errorCode = error.get("errorCode")
-                _message = error.get("message")
-                _severity = error.get("severity")
-
-                sourceLocation = None
-                error_type = None
-                error_code = None
-                severity = None
-                message = None
-
-                if _sourceLocation:
-                    _file = _sourceLocation.get("file")
-                    _start = _sourceLocation.get("start")
-                    _end = _sourceLocation.get("end")
-                    if _file is not None and _start is not None and _end is not None:
-                        sourceLocation = SourceLocation(_file, _start, _end)
-
-                if _type is not None:
-                    if _type.lower() == "warning":
-                        error_type = ErrorType.WARNING
-                    elif _type.lower() == "error":
-                        error_type = ErrorType.ERROR
-
-                if _errorCode is not None:
-                    error_code = _errorCode
-
-                if _severity is not None:
-                    if _severity.lower() == "warning":
-                        severity = Severity.WARNING
-                    elif _severity.lower() == "error":
-                        severity = Severity.ERROR
-
-                if _message is not None:
-                    message = _message
-
-                if (
-                    sourceLocation
-                    and error_type
-                    and error_code
-                    and severity
-                    and message
-                ):
-                    self.errors.append(
-                        Errors(
-                            sourceLocation, error_type, error_code, severity, message
-                        )
-                    )
+            self.errors.extend(filter(None, map(_parse_error, _errors)))
+
+    def _load_build_infos(self, _build_infos):
         if _build_infos:
-            for info in _build_infos:
-                _id = info.get("id")
-                _source_map = info.get("source_id_to_path")
-                _language = info.get("language")
-
-                if _id and _source_map and _language:
-                    self.build_infos.append(
-                        BuildInfo(
-                            id=_id,
-                            source_id_to_path=dict(_source_map),
-                            language=_language,
-                        )
-                    )
+            self.build_infos.extend(
+                BuildInfo(
+                    id=info["id"],
+                    source_id_to_path=dict(info["source_id_to_path"]),
+                    language=info["language"],
+                )
+                for info in _build_infos
+                if info.get("id")
+                and info.get("source_id_to_path")
+                and info.get("language")
+            )
 
     def _build_position_index(self):
         """Build spatial index for all AST nodes"""
-        # Build file_id to path mapping from build_infos
+        self._index_file_paths()
+
+        # Index all AST nodes, sharding files across processes if asked to
+        asts = [
+            file.source_file.ast
+            for files in self.sources.values()
+            for file in files
+            if file and file.source_file
+        ]
+        if self.workers > 1 and len(asts) > 1:
+            # Never fork: the server process runs an event loop and threads
+            context = multiprocessing.get_context("spawn")
+            chunksize = max(1, len(asts) // (self.workers * 4))
+            with ProcessPoolExecutor(self.workers, mp_context=context) as executor:
+                for columns in executor.map(_index_ast, asts, chunksize=chunksize):
+                    self.position_index.add_nodes(columns)
+        else:
+            for ast in asts:
+                self.position_index.add_nodes(_index_ast(ast))
+
+        self.position_index.finalize_index()
+
+    def _index_file_paths(self):
+        """Build file_id to path mapping from build_infos"""
         for build_info in self.build_infos:
             for file_id_str, file_path in build_info.source_id_to_path.items():
                 try:
@@ -275,122 +817,54 @@ class Root:
                 except ValueError:
                     continue
 
-        # Index all AST nodes
-        for file_path, files in self.sources.items():
-            for file in files:
-                if file and file.source_file:
-                    self._index_ast_nodes(file.source_file.ast, file.source_file.id, 0)
-
+    def _stream_initialize(self, file_path):
+        """Load errors and build infos and build the position index from a
+        streaming parse, without materializing the ASTs"""
+        columns, errors, build_infos = _stream_forge_ast(file_path)
+        self._load_errors(errors)
+        self._load_build_infos(build_infos)
+        self._index_file_paths()
+        self.position_index.add_nodes(columns)
         self.position_index.finalize_index()
 
-    def _index_ast_nodes(self, node: dict, file_id: int, depth: int):
-        """Recursively index AST nodes"""
-        if not isinstance(node, dict):
-            return
-
-        # Index current node if it has src and id
-        if "src" in node and "id" in node:
-            src_info = parse_src(node["src"])
-            if src_info:
-                start, length, node_file_id = src_info
-                node_index = AstNodeIndex(
-                    node_id=node["id"],
-                    file_id=node_file_id,
-                    start_byte=start,
-                    end_byte=start + length,
-                    node_type=node.get("nodeType", "Unknown"),
-                    node_data=node,
-                    depth=depth,
-                )
-                self.position_index.add_node(node_index)
-
-        # Recursively index child nodes
-        for key, value in node.items():
-            if key in [
-                "nodes",
-                "body",
-                "statements",
-                "members",
-                "parameters",
-                "declarations",
-                "symbolAliases",
-                "arguments",
-                "assignments",
-                "baseContracts",
-                "modifiers",
-            ]:
-                if isinstance(value, list):
-                    for child in value:
-                        self._index_ast_nodes(child, file_id, depth + 1)
-            elif key in [
-                "expression",
-                "leftExpression",
-                "leftHandSide",
-                "rightExpression",
-                "rightHandSide",
-                "value",
-                "typeName",
-                "baseExpression",
-                "parameters",
-                "baseName",
-                "parameterTypes",
-                "returnParameterTypes",
-            ]:
-                if isinstance(value, dict):
-                    self._index_ast_nodes(value, file_id, depth + 1)
-            elif isinstance(value, dict) and "nodeType" in value:
-                self._index_ast_nodes(value, file_id, depth + 1)
-
     def find_node_at_position(
         self, file_uri: str, line: int, character: int
     ) -> Optional[AstNodeIndex]:
         """Find the innermost AST node at the given LSP position"""
-        # Convert URI to file path and find matching file_id
-        file_id = None
-        for fid, path in self.position_index.file_id_to_path.items():
-            if file_uri.endswith(path) or path.endswith(
-                file_uri.replace("file://", "")
-            ):
-                file_id = fid
-                break
-
+        file_id = self.position_index.resolve_file_id(file_uri)
         if file_id is None:
             return None
 
-        # Read file content to convert position to byte offset
+        # Convert position to byte offset using the cached file content
         try:
-            file_path = self.position_index.file_id_to_path[file_id]
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-
-            byte_offset = lsp_position_to_byte_offset(content, line, character)
-            return self.position_index.find_innermost_node(file_id, byte_offset)
-        except (FileNotFoundError, KeyError):
+            source = self._get_source(file_id)
+        except (OSError, KeyError):
             return None
 
+        byte_offset = source.position_to_offset(line, character)
+        return self._lookup_cache(file_id, byte_offset)
+
+    def _lookup_node(self, file_id: int, byte_offset: int) -> Optional[AstNodeIndex]:
+        return self.position_index.find_innermost_node(file_id, byte_offset)
+
     def get_declaration_location(
         self, node: AstNodeIndex
     ) -> Optional[Tuple[str, int, int]]:
         """Get the declaration location for a node (file_uri, line, character)"""
-        # Look for referencedDeclaration first
-        referenced_id = node.node_data.get("referencedDeclaration")
-        if referenced_id and referenced_id in self.position_index.node_by_id:
-            target_node = self.position_index.node_by_id[referenced_id]
-            return self._node_to_location(target_node)
-
-        # Fallback: parse typeIdentifier for struct/enum references
-        type_desc = node.node_data.get("typeDescriptions", {})
-        type_id = type_desc.get("typeIdentifier", "")
-
-        # Extract node ID from typeIdentifier patterns like "t_struct$_Name_$123_"
-        import re
-
-        match = re.search(r"\$(\d+)", type_id)
-        if match:
-            target_id = int(match.group(1))
-            if target_id in self.position_index.node_by_id:
-                target_node = self.position_index.node_by_id[target_id]
-                return self._node_to_location(target_node)
+        target_node = self._declaration_cache(node)
+        if target_node is None:
+            return None
+        return self._node_to_location(target_node)
+
+    def _declaration_target(self, node: AstNodeIndex) -> Optional[AstNodeIndex]:
+        # Look for referencedDeclaration first, then fall back to the id
+        # embedded in typeIdentifier for struct/enum references
+        for target_id in (node.referenced_declaration, node.type_identifier_target):
+            if target_id is None:
+                continue
+            target_node = self.position_index.get_node(target_id)
+            if target_node is not None:
+                return target_node
 
         return None
 
@@ -402,15 +876,401 @@ class Root:
         file_path = self.position_index.file_id_to_path[node.file_id]
 
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-
-            line, character = byte_offset_to_lsp_position(content, node.start_byte)
-            file_uri = f"file://{file_path}"
-            return (file_uri, line, character)
-        except FileNotFoundError:
+            source = self._get_source(node.file_id)
+        except OSError:
             return None
 
+        line, character = source.offset_to_position(node.start_byte)
+        file_uri = f"file://{file_path}"
+        return (file_uri, line, character)
+
+    def _get_source(self, file_id: int) -> SourceText:
+        """Return the source text for ``file_id``, re-reading it only when the
+        file's mtime or size has changed since it was cached"""
+        file_path = self.position_index.file_id_to_path[file_id]
+        stat = os.stat(file_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        cached = self._source_cache.get(file_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        source = SourceText.from_file(file_path)
+        self._source_cache[file_id] = (version, source)
+        return source
+
+    def clear_caches(self):
+        """Drop cached source text and memoized lookups, e.g. after an edit"""
+        self._source_cache.clear()
+        self._lookup_cache.cache_clear()
+        self._declaration_cache.cache_clear()
+
+
+def _empty_columns() -> Dict[str, Sequence]:
+    """Empty output columns of ``_index_ast`` and ``_stream_forge_ast``.
+
+    ``type_ids`` index into the output's own ``type_names`` palette.
+    """
+    columns = {name: array(code) for name, code in _PACKED_COLUMNS}
+    columns["file_ids"] = array("i")
+    columns["type_names"] = []
+    return columns
+
+
+def _index_ast(ast: dict) -> Dict[str, Sequence]:
+    """Index the nodes of one source unit's AST.
+
+    Walks the tree with an explicit stack, parsing each node's src and
+    appending its row straight to the returned columns (see
+    ``PositionIndex.add_nodes``). Module-level so it can run in a worker
+    process.
+    """
+    columns = _empty_columns()
+    starts, ends, depths = columns["starts"], columns["ends"], columns["depths"]
+    node_ids, file_ids = columns["node_ids"], columns["file_ids"]
+    referenced_decls = columns["referenced_decls"]
+    type_targets = columns["type_targets"]
+    type_ids = columns["type_ids"]
+    type_palette: Dict[str, int] = {}
+
+    stack = [(ast, 0)]
+    while stack:
+        node, depth = stack.pop()
+
+        # Index current node if it has a well-formed src and an id
+        src = node.get("src")
+        if src is not None and "id" in node:
+            try:
+                start, length, node_file_id = map(int, src.split(":"))
+            except ValueError:
+                pass
+            else:
+                referenced_decl = node.get("referencedDeclaration")
+                starts.append(start)
+                ends.append(start + length)
+                depths.append(depth)
+                node_ids.append(node["id"])
+                file_ids.append(node_file_id)
+                referenced_decls.append(
+                    referenced_decl if type(referenced_decl) is int else _NO_TARGET
+                )
+                type_targets.append(_type_identifier_target(node))
+                node_type = node.get("nodeType", "Unknown")
+                type_id = type_palette.get(node_type)
+                if type_id is None:
+                    type_id = type_palette[node_type] = len(type_palette)
+                type_ids.append(type_id)
+
+        # Queue child nodes
+        for key, value in node.items():
+            if key in _LIST_KEYS and type(value) is list:
+                stack.extend(
+                    (child, depth + 1) for child in value if type(child) is dict
+                )
+            elif key in _DICT_KEYS and type(value) is dict:
+                stack.append((value, depth + 1))
+            elif type(value) is dict and "nodeType" in value:
+                stack.append((value, depth + 1))
+
+    columns["type_names"].extend(type_palette)
+    return columns
+
+
+# How a JSON object met while streaming relates to the nodes _index_ast
+# visits: never a node, a node whenever its parent is, or additionally only
+# if it has a "nodeType" key
+_NOT_NODE, _NODE, _MAYBE_NODE = 0, 1, 2
+
+# Top-level values of a Forge AST file kept by _stream_forge_ast
+_STREAM_CAPTURED_KEYS = frozenset({"errors", "build_infos"})
+
+# Fields a ``sources`` entry needs to be loaded by Root._initialize
+_ENTRY_FIELDS = frozenset({"version", "build_id", "profile"})
+
+
+class _StreamFrame:
+    """A JSON object or array that is open while streaming a Forge AST.
+
+    Frames inside a source unit's AST track the fields needed for an index
+    row. Rows of resolved nodes go to ``sink``; rows below a ``_MAYBE_NODE``
+    object wait in its ``pending`` list until it is known to be a node.
+    For arrays, ``reach`` and ``depth`` describe their items.
+    """
+
+    __slots__ = (
+        "is_map",
+        "key",
+        "in_ast",
+        "reach",
+        "depth",
+        "sink",
+        "pending",
+        "owner",
+        "src",
+        "node_id",
+        "node_type",
+        "has_node_type",
+        "referenced_decl",
+        "type_target",
+    )
+
+    def __init__(self, is_map: bool, in_ast: bool = False, reach: int = _NOT_NODE):
+        self.is_map = is_map
+        self.key = None
+        self.in_ast = in_ast
+        self.reach = reach
+        self.depth = 0
+        self.sink = None
+        self.pending = [] if reach == _MAYBE_NODE else None
+        # For a typeDescriptions object, the node frame it describes
+        self.owner = None
+        self.src = None
+        self.node_id = None
+        self.node_type = None
+        self.has_node_type = False
+        self.referenced_decl = _NO_TARGET
+        self.type_target = _NO_TARGET
+
+
+class _StreamEntry(_StreamFrame):
+    """An entry of a ``sources`` list while streaming a Forge AST.
+
+    Its fields may follow its AST in the file, so the AST's rows wait in
+    ``pending`` until the entry closes. ``node_id`` holds the
+    ``source_file`` id.
+    """
+
+    __slots__ = ("fields",)
+
+    def __init__(self):
+        super().__init__(True)
+        self.pending = []
+        # Keys of _ENTRY_FIELDS seen with a truthy value
+        self.fields = set()
+
+    def is_loaded(self) -> bool:
+        """Whether Root._initialize would keep this entry and index its AST"""
+        return type(self.node_id) is int and _ENTRY_FIELDS <= self.fields
+
+
+def _open_ast_child(parent: _StreamFrame, is_map: bool) -> _StreamFrame:
+    """Frame for an object or array nested in an AST frame, following the
+    child rules of ``_index_ast``"""
+    if parent.is_map:
+        if parent.reach == _NOT_NODE:
+            reach = _NOT_NODE
+        elif is_map:
+            reach = _NODE if parent.key in _DICT_KEYS else _MAYBE_NODE
+        else:
+            reach = _NODE if parent.key in _LIST_KEYS else _NOT_NODE
+        frame = _StreamFrame(is_map, True, reach)
+        frame.depth = parent.depth + 1
+        frame.sink = parent.sink if parent.reach == _NODE else parent.pending
+        if is_map and parent.reach != _NOT_NODE and parent.key == "typeDescriptions":
+            frame.owner = parent
+    else:
+        # Only objects directly in a child list are nodes
+        frame = _StreamFrame(is_map, True, parent.reach if is_map else _NOT_NODE)
+        frame.depth = parent.depth
+        frame.sink = parent.sink
+    return frame
+
+
+def _close_ast_node(frame: _StreamFrame):
+    """Emit the row of a closed AST object, and the rows waiting on it"""
+    if frame.reach == _MAYBE_NODE and not frame.has_node_type:
+        return
+    if frame.src is not None and frame.node_id is not None:
+        try:
+            start, length, node_file_id = map(int, frame.src.split(":"))
+        except ValueError:
+            pass
+        else:
+            frame.sink.append(
+                (
+                    start,
+                    start + length,
+                    frame.depth,
+                    frame.node_id,
+                    node_file_id,
+                    frame.referenced_decl,
+                    frame.type_target,
+                    frame.node_type,
+                )
+            )
+    if frame.pending:
+        frame.sink.extend(frame.pending)
+
+
+def _stream_forge_ast(file_path) -> Tuple[Dict[str, Sequence], list, list]:
+    """Index a Forge AST JSON file from ijson parse events.
+
+    Produces the same rows as running ``_index_ast`` over the source units
+    ``Root._initialize`` loads, plus the raw top-level ``errors`` and
+    ``build_infos`` values, without ever building the AST dicts.
+    """
+    rows = []
+    captured = {}
+    stack: List[_StreamFrame] = []
+    builder = None
+    builder_depth = 0
+
+    with open(file_path, "rb") as f:
+        for event, value in ijson.basic_parse(f):
+            if (
+                builder is None
+                and len(stack) == 1
+                and stack[0].key in _STREAM_CAPTURED_KEYS
+                and event != "map_key"
+                and event != "end_map"
+            ):
+                builder = ijson.ObjectBuilder()
+                builder_depth = 0
+            if builder is not None:
+                builder.event(event, value)
+                if event == "start_map" or event == "start_array":
+                    builder_depth += 1
+                elif event == "end_map" or event == "end_array":
+                    builder_depth -= 1
+                if builder_depth == 0:
+                    captured[stack[0].key] = builder.value
+                    builder = None
+                continue
+
+            if event == "map_key":
+                frame = stack[-1]
+                frame.key = value
+                if value == "nodeType":
+                    frame.has_node_type = True
+                continue
+
+            if event == "end_map" or event == "end_array":
+                frame = stack.pop()
+                if frame.in_ast and frame.is_map and frame.reach != _NOT_NODE:
+                    _close_ast_node(frame)
+                elif type(frame) is _StreamEntry and frame.is_loaded():
+                    rows.extend(frame.pending)
+                continue
+
+            is_container = event == "start_map" or event == "start_array"
+            if not stack:
+                if is_container:
+                    stack.append(_StreamFrame(event == "start_map"))
+                continue
+
+            parent = stack[-1]
+            if parent.in_ast:
+                if is_container:
+                    stack.append(_open_ast_child(parent, event == "start_map"))
+                    continue
+                key = parent.key
+                if parent.owner is not None and key == "typeIdentifier":
+                    if event == "string":
+                        match = _TYPE_ID_SEARCH(value)
+                        if match:
+                            parent.owner.type_target = int(match.group(1))
+                if parent.reach == _NOT_NODE:
+                    continue
+                if key == "src":
+                    parent.src = value if event == "string" else None
+                elif key == "id":
+                    parent.node_id = value if type(value) is int else None
+                elif key == "nodeType":
+                    parent.node_type = value
+                elif key == "referencedDeclaration" and type(value) is int:
+                    parent.referenced_decl = value
+                continue
+
+            if not is_container:
+                if len(stack) == 4 and type(parent) is _StreamEntry:
+                    if value and parent.key in _ENTRY_FIELDS:
+                        parent.fields.add(parent.key)
+                elif (
+                    len(stack) == 5
+                    and type(stack[3]) is _StreamEntry
+                    and stack[3].key == "source_file"
+                    and parent.key == "id"
+                ):
+                    stack[3].node_id = value
+                continue
+            if (
+                event == "start_map"
+                and len(stack) == 3
+                and stack[0].key == "sources"
+                and not stack[2].is_map
+            ):
+                stack.append(_StreamEntry())
+            elif (
+                event == "start_map"
+                and len(stack) == 5
+                and type(stack[3]) is _StreamEntry
+                and stack[3].key == "source_file"
+                and stack[4].key == "ast"
+            ):
+                # A source unit's AST: the root node, at depth 0
+                frame = _StreamFrame(True, True, _NODE)
+                frame.sink = stack[3].pending
+                stack.append(frame)
+            else:
+                stack.append(_StreamFrame(event == "start_map"))
+
+    columns = _empty_columns()
+    for name, index in (
+        ("starts", 0),
+        ("ends", 1),
+        ("depths", 2),
+        ("node_ids", 3),
+        ("file_ids", 4),
+        ("referenced_decls", 5),
+        ("type_targets", 6),
+    ):
+        columns[name].extend(row[index] for row in rows)
+    type_palette: Dict[str, int] = {}
+    for row in rows:
+        node_type = "Unknown" if row[7] is None else row[7]
+        type_id = type_palette.get(node_type)
+        if type_id is None:
+            type_id = type_palette[node_type] = len(type_palette)
+        columns["type_ids"].append(type_id)
+    columns["type_names"].extend(type_palette)
+    return columns, captured.get("errors"), captured.get("build_infos")
+
+
+def _parse_error(error: dict) -> Optional[Errors]:
+    """Errors entry for a compiler error, or None if a field is missing"""
+    location = error.get("sourceLocation")
+    if not location:
+        return None
+    file, start, end = location.get("file"), location.get("start"), location.get("end")
+    if file is None or start is None or end is None:
+        return None
+    _type = error.get("type")
+    _severity = error.get("severity")
+    error_type = _ERROR_TYPES.get(_type.lower()) if _type is not None else None
+    severity = _SEVERITIES.get(_severity.lower()) if _severity is not None else None
+    error_code = error.get("errorCode")
+    message = error.get("message")
+    if error_type and error_code and severity and message:
+        return Errors(
+            SourceLocation(file, start, end), error_type, error_code, severity, message
+        )
+    return None
+
+
+def _type_identifier_target(node: dict) -> int:
+    """Node id in typeDescriptions.typeIdentifier, or _NO_TARGET.
+
+    Matches patterns like "t_struct$_Name_$123_storage_ptr".
+    """
+    type_desc = node.get("typeDescriptions")
+    if type(type_desc) is dict:
+        type_id = type_desc.get("typeIdentifier")
+        if type(type_id) is str:
+            match = _TYPE_ID_SEARCH(type_id)
+            if match:
+                return int(match.group(1))
+    return _NO_TARGET
+
 
 def parse_src(src: str) -> Optional[Tuple[int, int, int]]:
     """Parse Solidity AST src format 'start:length:file_id'"""
@@ -428,63 +1288,31 @@ def parse_src(src: str) -> Optional[Tuple[int, int, int]]:
 
 def lsp_position_to_byte_offset(content: str, line: int, character_utf16: int) -> int:
     """Convert LSP position (line, UTF-16 character) to byte offset"""
-    lines = content.split("\n")
-
-    if line >= len(lines):
-        return len(content.encode("utf-8"))
-
-    # Get byte offset to start of target line
-    line_start_bytes = 0
-    for i in range(line):
-        if i < len(lines):
-            line_start_bytes += len(lines[i].encode("utf-8")) + 1  # +1 for \n
-
-    # Convert UTF-16 character offset to byte offset within the line
-    target_line = lines[line]
-    utf16_count = 0
-    byte_offset_in_line = 0
-
-    for char in target_line:
-        if utf16_count >= character_utf16:
-            break
-        utf16_count += len(char.encode("utf-16le")) // 2  # UTF-16 code units
-        byte_offset_in_line += len(char.encode("utf-8"))
-
-    return line_start_bytes + byte_offset_in_line
+    source = SourceText.from_bytes(content.encode("utf-8"))
+    return source.position_to_offset(line, character_utf16)
 
 
 def byte_offset_to_lsp_position(content: str, byte_offset: int) -> Tuple[int, int]:
     """Convert byte offset to LSP position (line, UTF-16 character)"""
-    content_bytes = content.encode("utf-8")
-
-    if byte_offset >= len(content_bytes):
-        lines = content.split("\n")
-        last_line = lines[-1] if lines else ""
-        return (len(lines) - 1, len(last_line.encode("utf-16le")) // 2)
+    source = SourceText.from_bytes(content.encode("utf-8"))
+    return source.offset_to_position(byte_offset)
 
-    # Find line containing the byte offset
-    lines = content.split("\n")
-    current_byte = 0
 
-    for line_num, line in enumerate(lines):
-        line_bytes = len(line.encode("utf-8"))
-
-        if current_byte + line_bytes >= byte_offset:
-            # Found the line, now find character position
-            byte_in_line = byte_offset - current_byte
-            line_prefix = line.encode("utf-8")[:byte_in_line].decode(
-                "utf-8", errors="ignore"
-            )
-            utf16_char = len(line_prefix.encode("utf-16le")) // 2
-            return (line_num, utf16_char)
+def loads_json(data: bytes):
+    """Parse JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
-        current_byte += line_bytes + 1  # +1 for \n
 
-    # Fallback
-    return (len(lines) - 1, 0)
+def dumps_json(obj) -> bytes:
+    """Serialize to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
 
 
 def read_file(filename):
-    with open(filename, "r") as f:
-        data = json.load(f)
-    return data
+    """Parse a Forge AST JSON file, using orjson when it is installed"""
+    with open(filename, "rb") as f:
+        return loads_json(f.read())
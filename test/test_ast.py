@@ -1,4 +1,6 @@
+import json
 import pytest
+from dataclasses import replace
 from pathlib import Path
 from lsp.ast import Root
 
@@ -61,3 +63,198 @@ def test_lsp_position_conversion():
     byte_offset = lsp_position_to_byte_offset(content, 2, 0)  # Start of emoji line
     line, char = byte_offset_to_lsp_position(content, byte_offset)
     assert line == 2
+
+
+def test_innermost_node_matches_linear_scan(f):
+    """Binary-searched lookups agree with a scan over every indexed node"""
+    index = f.position_index
+    for file_id, table in index.file_tables.items():
+        rows = list(zip(table.starts, table.ends, table.depths))
+        for offset in range(0, max(table.ends) + 1):
+            depths = [d for start, end, d in rows if start <= offset < end]
+            found = index.find_innermost_node(file_id, offset)
+            if not depths:
+                assert found is None
+                continue
+            assert found.depth == max(depths)
+            assert found.start_byte <= offset < found.end_byte
+            assert index.get_node(found.node_id) == found
+
+
+def test_source_cache(f, tmp_path):
+    """Source text is read once and re-read only after the file changes"""
+    path = tmp_path / "D.sol"
+    path.write_text("contract D {}\n")
+    f.position_index.file_id_to_path[99] = str(path)
+
+    source = f._get_source(99)
+    assert list(source.line_offsets) == [0, 14]
+    assert f._get_source(99) is source
+
+    path.write_text("contract D {\n}\n")
+    assert f._get_source(99).content == b"contract D {\n}\n"
+
+    path.write_text("")
+    assert f._get_source(99).position_to_offset(0, 5) == 0
+
+    # Unreadable sources give no location instead of raising
+    f.position_index.file_id_to_path[99] = str(tmp_path)
+    node = f.position_index.get_node(next(iter(f.position_index.node_by_id)))
+    assert f._node_to_location(replace(node, file_id=99)) is None
+
+
+def test_utf16_positions_on_non_ascii_line():
+    """Surrogate pairs count as two UTF-16 units, multi-byte chars as one"""
+    from lsp.ast import SourceText
+
+    source = SourceText.from_bytes("x\né🌍b\n".encode("utf-8"))
+
+    assert source.position_to_offset(1, 0) == 2
+    assert source.position_to_offset(1, 1) == 4  # after é (2 bytes)
+    assert source.position_to_offset(1, 3) == 8  # after 🌍 (4 bytes)
+    assert source.position_to_offset(1, 99) == 9  # clamped to end of line
+    assert source.offset_to_position(8) == (1, 3)
+    assert source.offset_to_position(6) == (1, 1)  # inside 🌍
+
+
+def test_index_cache_round_trip(tmp_path):
+    """A second Root with the same cache restores the index without the JSON"""
+    cache_path = tmp_path / "index.sqlite"
+    built = Root(file_path=Path("test/c.forge.ast.json"), cache_path=cache_path)
+    cached = Root(file_path=Path("test/c.forge.ast.json"), cache_path=cache_path)
+
+    assert built.sources and not cached.sources
+    assert cached.errors == built.errors
+    assert cached.build_infos == built.build_infos
+    assert cached.position_index.node_by_id == built.position_index.node_by_id
+    for file_id, table in built.position_index.file_tables.items():
+        restored = cached.position_index.file_tables[file_id]
+        assert list(restored.starts) == list(table.starts)
+        assert list(restored.ends) == list(table.ends)
+        assert list(restored.parents) == list(table.parents)
+        assert list(restored.type_ids) == list(table.type_ids)
+        assert restored.type_names == table.type_names
+        for row in range(len(table)):
+            node_id = table.node_ids[row]
+            assert cached.get_declaration_location(
+                cached.position_index.get_node(node_id)
+            ) == built.get_declaration_location(built.position_index.get_node(node_id))
+
+
+def test_resolve_file_id(f):
+    """URIs resolve to file ids by exact path or by trailing path components"""
+    index = f.position_index
+    assert index.resolve_file_id("file:///Users/meek/Developer/lsp/C.sol") == 2
+    assert index.resolve_file_id("file://A.sol") == 0
+    assert index.resolve_file_id("file:///Users/meek/Developer/lsp/XC.sol") is None
+    assert index.resolve_file_id("file:///Users/meek/Developer/lsp/C.sol") == 2
+
+
+def test_lookup_memoized(f):
+    """Repeated lookups at one position are served from the LRU cache"""
+    uri = "file:///Users/meek/Developer/lsp/C.sol"
+    node = f.find_node_at_position(uri, line=10, character=10)
+    assert f.find_node_at_position(uri, line=10, character=10) is node
+    assert f._lookup_cache.cache_info().hits == 1
+
+    location = f.get_declaration_location(node)
+    assert f.get_declaration_location(node) == location
+    assert f._declaration_cache.cache_info().hits == 1
+
+    f.clear_caches()
+    assert f._lookup_cache.cache_info().currsize == 0
+
+
+def test_declaration_location_follows_edits(f, tmp_path):
+    """Editing the target file moves the memoized declaration location"""
+    node = next(
+        table.node_at(row)
+        for table in f.position_index.file_tables.values()
+        for row in range(len(table))
+        if table.referenced_decls[row] != -1
+        and f.position_index.get_node(table.referenced_decls[row]) is not None
+    )
+    target = f.position_index.get_node(node.referenced_declaration)
+    path = tmp_path / "Target.sol"
+    path.write_text("x" * target.end_byte)
+    f.position_index.file_id_to_path[target.file_id] = str(path)
+
+    assert f.get_declaration_location(node) == (
+        f"file://{path}",
+        0,
+        target.start_byte,
+    )
+
+    path.write_text("\n" * 5 + "x" * target.end_byte)
+    assert f.get_declaration_location(node) == (
+        f"file://{path}",
+        5,
+        target.start_byte - 5,
+    )
+    assert f._declaration_cache.cache_info().hits == 1
+
+
+def test_parallel_index_matches_serial(f):
+    """Indexing files in worker processes builds the same tables"""
+    parallel = Root(file_path=Path("test/c.forge.ast.json"), workers=2)
+
+    assert parallel.position_index.node_by_id == f.position_index.node_by_id
+    for file_id, table in f.position_index.file_tables.items():
+        assert parallel.position_index.file_tables[file_id] == table
+
+
+def test_source_file_traversals():
+    """Iterative traversals visit a binary tree in the expected orders"""
+    from types import SimpleNamespace
+    from lsp.ast import SourceFile
+
+    def tree(name, left=None, right=None):
+        return SimpleNamespace(name=name, left=left, right=right)
+
+    root = tree("a", tree("b", tree("d"), tree("e")), tree("c", None, tree("f")))
+    source_file = SourceFile(id=0, ast={})
+
+    assert [n.name for n in source_file.preorder(root)] == list("abdecf")
+    assert [n.name for n in source_file.inorder(root)] == list("dbeacf")
+    assert [n.name for n in source_file.postorder(root)] == list("debfca")
+    assert list(source_file.preorder(None)) == []
+
+
+def test_streaming_index_matches_full_parse(f):
+    """A streaming parse builds the same index without loading the sources"""
+    pytest.importorskip("ijson")
+    streamed = Root(file_path=Path("test/c.forge.ast.json"), streaming=True)
+
+    assert streamed.sources == {}
+    assert streamed.errors == f.errors
+    assert streamed.build_infos == f.build_infos
+    assert streamed.position_index.node_by_id == f.position_index.node_by_id
+    for file_id, table in f.position_index.file_tables.items():
+        assert streamed.position_index.file_tables[file_id] == table
+
+
+def test_streaming_skips_entries_initialize_skips(tmp_path):
+    """Streaming indexes only the sources entries a full parse loads"""
+    pytest.importorskip("ijson")
+    data = json.loads(Path("test/c.forge.ast.json").read_text())
+    entry = next(iter(data["sources"].values()))[0]
+    del entry["profile"]
+    path = tmp_path / "partial.forge.ast.json"
+    path.write_text(json.dumps(data))
+
+    full = Root(file_path=path)
+    streamed = Root(file_path=path, streaming=True)
+
+    assert entry["source_file"]["id"] not in full.position_index.file_tables
+    assert streamed.position_index.node_by_id == full.position_index.node_by_id
+    for file_id, table in full.position_index.file_tables.items():
+        assert streamed.position_index.file_tables[file_id] == table
+
+
+def test_streaming_requires_ijson(monkeypatch):
+    """Asking for a streaming parse without ijson fails loudly"""
+    import lsp.ast
+
+    monkeypatch.setattr(lsp.ast, "ijson", None)
+    with pytest.raises(ImportError):
+        Root(file_path=Path("test/c.forge.ast.json"), streaming=True)
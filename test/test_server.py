@@ -0,0 +1,64 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+import lsp
+from lsp import _log_request_error
+
+
+def test_request_errors_are_logged(caplog):
+    """Exceptions from pooled request handlers are not swallowed"""
+    future = Future()
+    future.set_exception(ValueError("bad request"))
+    with caplog.at_level(logging.ERROR):
+        _log_request_error(future)
+
+    assert "Request handler failed" in caplog.text
+    assert "bad request" in caplog.text
+
+
+def _frame(message: dict) -> bytes:
+    body = json.dumps(message).encode()
+    return b"Content-Length: %d\r\n\r\n" % len(body) + body
+
+
+def _responses(output: bytes) -> list:
+    responses = []
+    while output:
+        header, _, rest = output.partition(b"\r\n\r\n")
+        length = int(header.split(b":")[1])
+        responses.append(json.loads(rest[:length]))
+        output = rest[length:]
+    return responses
+
+
+@pytest.mark.parametrize("stdin_kind", ["pipe", "file"])
+def test_serve_answers_framed_messages(tmp_path, stdin_kind):
+    """The server reads framed requests from a pipe or a redirected file"""
+    session = _frame({"jsonrpc": "2.0", "id": 1, "method": "initialize"})
+    session += _frame({"jsonrpc": "2.0", "id": 2, "method": "nope"})
+    command = [sys.executable, "-c", "import lsp; lsp.serve()"]
+    env = dict(os.environ, PYTHONPATH=str(Path(lsp.__file__).parents[1]))
+
+    if stdin_kind == "file":
+        session_path = tmp_path / "session.bin"
+        session_path.write_bytes(session)
+        with open(session_path, "rb") as stdin:
+            result = subprocess.run(
+                command, stdin=stdin, capture_output=True, env=env, timeout=30
+            )
+    else:
+        result = subprocess.run(
+            command, input=session, capture_output=True, env=env, timeout=30
+        )
+
+    assert result.returncode == 0, result.stderr
+    responses = sorted(_responses(result.stdout), key=lambda r: r["id"])
+    assert responses[0] == {"jsonrpc": "2.0", "id": 1, "result": {"capabilities": {}}}
+    assert responses[1]["error"]["code"] == -32002